@@ -5,19 +5,41 @@ AWS S3 utilities for automatic credential detection and client initialization.
 This module provides functions for:
 - Initializing S3 clients with automatic credential detection
 - Testing S3 bucket access
+- Listing S3 keys, either directly or from an S3 Inventory report
 - Setting up fsspec filesystem for S3 operations
 """
 
+import csv
+import io
+import json
+import functools
 import boto3
 import fsspec
+import jmespath
+from botocore.config import Config
 from botocore.exceptions import NoCredentialsError, ClientError
-from typing import Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Tuple, Optional
+from urllib.parse import quote, unquote_plus
 
 
-def initialize_s3_client(bucket_name: str = 'nasa-disasters', verbose: bool = True) -> Tuple[Optional[boto3.client], Optional[fsspec.AbstractFileSystem]]:
+# Shared by every client this module creates: pooled keep-alive connections sized
+# for the parallel listing/transfer paths, plus adaptive client-side retries
+S3_CLIENT_CONFIG = Config(
+    retries={'max_attempts': 5, 'mode': 'adaptive'},
+    max_pool_connections=64,
+    tcp_keepalive=True,
+)
+
+
+def initialize_s3_client(bucket_name: str = 'nasa-disasters', verbose: bool = True, accelerate: bool = False) -> Tuple[Optional[boto3.client], Optional[fsspec.AbstractFileSystem]]:
     """
     Initialize AWS S3 Client with automatic credential detection.
     
+    Successful clients are cached per (bucket_name, verbose), so repeated calls
+    reuse the same client without new S3 round-trips. Failures are not cached.
+    Use initialize_s3_client.cache_clear() to force a fresh client.
+    
     This function will automatically use AWS credentials from:
     1. Environment variables (AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY)
     2. AWS CLI configuration (~/.aws/credentials)
@@ -26,42 +48,58 @@ def initialize_s3_client(bucket_name: str = 'nasa-disasters', verbose: bool = Tr
     Args:
         bucket_name: Name of the bucket to test access (default: 'nasa-disasters')
         verbose: If True, print status messages
+        accelerate: If True, use the S3 Transfer Acceleration endpoint when the
+                    bucket has acceleration enabled
     
     Returns:
         Tuple of (s3_client, fs_read) where:
         - s3_client: Initialized boto3 S3 client or None if failed
         - fs_read: Initialized fsspec filesystem or None if failed
     """
+    try:
+        return _cached_init(bucket_name, int(verbose), accelerate)
+    except _UncachedFailure:
+        return None, None
+
+
+class _UncachedFailure(Exception):
+    """Raised by the memoized helpers so lru_cache does not store a failed result."""
+
+
+@functools.lru_cache(maxsize=4)
+def _cached_init(bucket_name: str, verbose_int: int, accelerate: bool = False) -> Tuple[boto3.client, fsspec.AbstractFileSystem]:
+    """Memoize successful `_init_s3_client` results; failures raise _UncachedFailure."""
+    s3_client, fs_read = _init_s3_client(bucket_name, bool(verbose_int), accelerate)
+    if s3_client is None:
+        # Don't pin a failure; credentials may be fixed before the next call
+        raise _UncachedFailure(bucket_name)
+    return s3_client, fs_read
+
+
+def _init_s3_client(bucket_name: str, verbose: bool, accelerate: bool) -> Tuple[Optional[boto3.client], Optional[fsspec.AbstractFileSystem]]:
+    """Create and probe the S3 client for `initialize_s3_client`."""
     s3_client = None
     fs_read = None
     
     try:
         # Create S3 client - will automatically use AWS credentials
-        s3_client = boto3.client('s3')
+        s3_client = boto3.client('s3', config=S3_CLIENT_CONFIG)
         
-        # Test connection
+        # Test access to the bucket we actually need
         try:
-            # Try to list buckets (might fail due to permissions, that's OK)
-            response = s3_client.list_buckets()
+            s3_client.head_bucket(Bucket=bucket_name)
             if verbose:
                 print(f"✅ S3 client initialized successfully")
-                print(f"   Found {len(response.get('Buckets', []))} accessible buckets")
-        except ClientError as e:
-            if e.response['Error']['Code'] == 'AccessDenied':
+                print(f"✅ Confirmed access to {bucket_name} bucket")
+        except ClientError as bucket_error:
+            if bucket_error.response['Error']['Code'] in ('403', '404', 'AccessDenied', 'NoSuchBucket'):
                 if verbose:
-                    print(f"⚠️ S3 client initialized (limited bucket list access)")
-                # Test access to specific bucket
-                try:
-                    s3_client.head_bucket(Bucket=bucket_name)
-                    if verbose:
-                        print(f"✅ Confirmed access to {bucket_name} bucket")
-                except ClientError as bucket_error:
-                    if verbose:
-                        print(f"❌ Cannot access {bucket_name} bucket: {bucket_error}")
-                    s3_client = None
-                    return None, None
-            else:
-                raise e
+                    print(f"❌ Cannot access {bucket_name} bucket: {bucket_error}")
+                return None, None
+            raise
+        
+        if accelerate:
+            s3_client = _accelerated_client(s3_client, bucket_name, verbose)
         
         # Also initialize fsspec filesystem for S3
         fs_read = fsspec.filesystem("s3", anon=False, skip_instance_cache=False)
@@ -85,6 +123,28 @@ def initialize_s3_client(bucket_name: str = 'nasa-disasters', verbose: bool = Tr
     return s3_client, fs_read
 
 
+initialize_s3_client.cache_clear = _cached_init.cache_clear
+
+
+def _accelerated_client(s3_client: boto3.client, bucket_name: str, verbose: bool) -> boto3.client:
+    """Return a Transfer Acceleration client if the bucket supports it, else `s3_client`."""
+    try:
+        status = s3_client.get_bucket_accelerate_configuration(Bucket=bucket_name).get('Status')
+    except ClientError as e:
+        status = None
+        if verbose:
+            print(f"⚠️ Could not read Transfer Acceleration status for {bucket_name}: {e}")
+    
+    if status != 'Enabled':
+        if verbose:
+            print(f"⚠️ Transfer Acceleration not enabled on {bucket_name}, using standard endpoint")
+        return s3_client
+    
+    if verbose:
+        print("✅ Using S3 Transfer Acceleration endpoint")
+    return boto3.client('s3', config=S3_CLIENT_CONFIG.merge(Config(s3={'use_accelerate_endpoint': True})))
+
+
 def verify_s3_client(s3_client: Optional[boto3.client], bucket_name: str = 'nasa-disasters', verbose: bool = True) -> bool:
     """
     Verify that S3 client is ready for operations.
@@ -110,7 +170,37 @@ def verify_s3_client(s3_client: Optional[boto3.client], bucket_name: str = 'nasa
         return True
 
 
-def get_all_s3_keys(s3_client: boto3.client, bucket: str, prefix: str, ext: str = ".tif") -> list:
+def _tif_key_query(ext: str) -> str:
+    """Build the JMESPath expression selecting keys with `ext` that are not historical."""
+    return f"Contents[?ends_with(Key, '{ext}') && !contains(Key, 'historical')].Key"
+
+
+def _list_prefix_keys(s3_client: boto3.client, bucket: str, prefix: str, ext: str) -> List[str]:
+    """
+    List every key under a single prefix, filtered by extension.
+    
+    Raises ClientError so callers can decide how to report it.
+    """
+    paginator = s3_client.get_paginator("list_objects_v2")
+    pages = paginator.paginate(
+        Bucket=bucket,
+        Prefix=prefix,
+        PaginationConfig={"PageSize": 1000},
+    )
+    
+    # Let botocore apply the extension / "historical" filter to each page via JMESPath
+    return [key for key in pages.search(_tif_key_query(ext)) if key is not None]
+
+
+def get_all_s3_keys(
+    s3_client: boto3.client,
+    bucket: str,
+    prefix: str,
+    ext: str = ".tif",
+    recursive_parallel: bool = False,
+    max_workers: int = 16,
+    prefixes_only: bool = False
+) -> list:
     """
     Get a list of all keys in an S3 bucket with a specific extension.
     
@@ -119,35 +209,233 @@ def get_all_s3_keys(s3_client: boto3.client, bucket: str, prefix: str, ext: str
         bucket: S3 bucket name
         prefix: Prefix path to search in
         ext: File extension to filter (default: ".tif")
+        recursive_parallel: If True, discover the sub-prefixes directly below
+            `prefix` and list each of them concurrently
+        max_workers: Maximum number of listing threads when `recursive_parallel`
+            is set (kept modest to avoid S3 SlowDown responses)
+        prefixes_only: If True, return only the sub-prefixes ("directories")
+            directly below `prefix` instead of enumerating files; `ext` is ignored
     
     Returns:
-        List of S3 keys matching the criteria
+        List of S3 keys matching the criteria (or of sub-prefixes, each ending
+        in '/', when `prefixes_only` is set)
     """
     if s3_client is None:
         print("❌ S3 client not initialized")
         return []
     
-    keys = []
-    kwargs = {"Bucket": bucket, "Prefix": f"{prefix}/"}
-    
-    while True:
+    if prefixes_only:
+        paginator = s3_client.get_paginator("list_objects_v2")
+        pages = paginator.paginate(
+            Bucket=bucket,
+            Prefix=f"{prefix}/",
+            Delimiter="/",
+            PaginationConfig={"PageSize": 1000},
+        )
         try:
-            resp = s3_client.list_objects_v2(**kwargs)
-            if 'Contents' in resp:
-                for obj in resp["Contents"]:
-                    if obj["Key"].endswith(ext) and "historical" not in obj["Key"]:
-                        keys.append(obj["Key"])
+            return [p for p in pages.search("CommonPrefixes[].Prefix") if p is not None]
         except ClientError as e:
-            print(f"❌ Error listing objects: {e}")
-            break
+            print(f"❌ Error listing prefixes: {e}")
+            return []
+    
+    if recursive_parallel:
+        return _get_all_s3_keys_parallel(s3_client, bucket, prefix, ext, max_workers)
+    
+    try:
+        return _list_prefix_keys(s3_client, bucket, f"{prefix}/", ext)
+    except ClientError as e:
+        print(f"❌ Error listing objects: {e}")
+        return []
+
+
+def _get_all_s3_keys_parallel(
+    s3_client: boto3.client,
+    bucket: str,
+    prefix: str,
+    ext: str,
+    max_workers: int
+) -> List[str]:
+    """Fan `get_all_s3_keys` out over the CommonPrefixes directly below `prefix`."""
+    keys = []
+    sub_prefixes = []
+    
+    # One delimited listing gives both the objects at this level and the sub-prefixes to fan out to
+    paginator = s3_client.get_paginator("list_objects_v2")
+    pages = paginator.paginate(
+        Bucket=bucket,
+        Prefix=f"{prefix}/",
+        Delimiter="/",
+        PaginationConfig={"PageSize": 1000},
+    )
+    query = _tif_key_query(ext)
+    try:
+        for page in pages:
+            keys.extend(jmespath.search(query, page) or [])
+            sub_prefixes.extend(p["Prefix"] for p in page.get("CommonPrefixes", []))
+    except ClientError as e:
+        print(f"❌ Error listing objects: {e}")
+        return []
+    
+    if not sub_prefixes:
+        return keys
+    
+    # boto3 low-level clients are thread-safe, so every worker shares the caller's
+    # client (and with it the caller's credentials and endpoint)
+    def list_sub_prefix(sub_prefix: str) -> List[str]:
+        return _list_prefix_keys(s3_client, bucket, sub_prefix, ext)
+    
+    workers = max(1, min(max_workers, len(sub_prefixes)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(list_sub_prefix, p): p for p in sub_prefixes}
+        for future in as_completed(futures):
+            try:
+                keys.extend(future.result())
+            except ClientError as e:
+                print(f"❌ Error listing objects under {futures[future]}: {e}")
+    
+    # Preserve the lexicographic ordering a single ListObjectsV2 walk would give
+    keys.sort()
+    return keys
+
 
+def _find_inventory_manifest(s3_client: boto3.client, inventory_bucket: str, inventory_prefix: str) -> Optional[dict]:
+    """
+    Load the newest S3 Inventory manifest.json under `inventory_prefix`.
+    
+    `inventory_prefix` may point either at a single delivery (the directory that
+    holds manifest.json) or at the inventory configuration root, in which case
+    the most recent dated delivery is used.
+    """
+    prefix = inventory_prefix.strip('/')
+    candidates = [f"{prefix}/manifest.json"]
+    
+    paginator = s3_client.get_paginator("list_objects_v2")
+    pages = paginator.paginate(Bucket=inventory_bucket, Prefix=f"{prefix}/", Delimiter="/")
+    deliveries = sorted(pages.search("CommonPrefixes[].Prefix"), reverse=True)
+    # Deliveries are named YYYY-MM-DDTHH-MMZ, so the lexicographic max is the newest
+    candidates.extend(f"{d}manifest.json" for d in deliveries if d and d[len(prefix) + 1:][:1].isdigit())
+    
+    for manifest_key in candidates:
         try:
-            kwargs["ContinuationToken"] = resp.get("NextContinuationToken")
-            if not kwargs["ContinuationToken"]:
-                break
-        except KeyError:
-            break
+            resp = s3_client.get_object(Bucket=inventory_bucket, Key=manifest_key)
+        except ClientError:
+            continue
+        return json.loads(resp["Body"].read())
+    
+    return None
+
+
+def _select_inventory_keys(
+    s3_client: boto3.client,
+    inventory_bucket: str,
+    data_key: str,
+    file_format: str,
+    key_column: str,
+    target_prefix: str,
+    ext: str
+) -> List[str]:
+    """Run S3 Select against one inventory data file and return the matching (decoded) keys."""
+    # CSV inventories URL-encode keys, so match the prefix in either form
+    encoded_prefix = quote(target_prefix, safe='')
+    sql = (
+        f"SELECT {key_column} FROM s3object s "
+        f"WHERE ({key_column} LIKE '{target_prefix}/%' OR {key_column} LIKE '{encoded_prefix}%2F%') "
+        f"AND {key_column} LIKE '%{ext}' "
+        f"AND {key_column} NOT LIKE '%historical%'"
+    )
+    
+    if file_format == "Parquet":
+        input_serialization = {"Parquet": {}}
+    else:
+        input_serialization = {"CSV": {"FileHeaderInfo": "NONE"}, "CompressionType": "GZIP"}
+    
+    resp = s3_client.select_object_content(
+        Bucket=inventory_bucket,
+        Key=data_key,
+        ExpressionType="SQL",
+        Expression=sql,
+        InputSerialization=input_serialization,
+        OutputSerialization={"CSV": {}},
+    )
+    
+    chunks = [event["Records"]["Payload"] for event in resp["Payload"] if "Records" in event]
+    rows = csv.reader(io.StringIO(b"".join(chunks).decode("utf-8")))
+    
+    keys = []
+    for row in rows:
+        if not row:
+            continue
+        key = unquote_plus(row[0]) if file_format == "CSV" else row[0]
+        if key.startswith(f"{target_prefix}/"):
+            keys.append(key)
+    return keys
 
+
+def get_all_s3_keys_from_inventory(
+    s3_client: boto3.client,
+    inventory_bucket: Optional[str],
+    inventory_prefix: Optional[str],
+    target_prefix: str,
+    ext: str = ".tif",
+    source_bucket: Optional[str] = None
+) -> list:
+    """
+    Get keys under a prefix from a daily S3 Inventory report instead of listing the bucket.
+    
+    Each inventory data file is filtered server-side with S3 Select, so the cost is
+    one request per data file rather than one ListObjectsV2 call per 1000 keys.
+    Falls back to `get_all_s3_keys` when no inventory is configured or readable.
+    
+    Args:
+        s3_client: Initialized boto3 S3 client
+        inventory_bucket: Bucket the inventory reports are delivered to (None to skip)
+        inventory_prefix: Prefix of the inventory configuration or of a single delivery
+        target_prefix: Prefix path to search in (same form as `get_all_s3_keys`)
+        ext: File extension to filter (default: ".tif")
+        source_bucket: Bucket to list directly if the inventory can't be used
+                       (defaults to the manifest's source bucket)
+    
+    Returns:
+        List of S3 keys matching the criteria, sorted lexicographically
+    """
+    if s3_client is None:
+        print("❌ S3 client not initialized")
+        return []
+    
+    manifest = None
+    if inventory_bucket and inventory_prefix:
+        try:
+            manifest = _find_inventory_manifest(s3_client, inventory_bucket, inventory_prefix)
+        except ClientError as e:
+            print(f"⚠️ Could not read inventory manifest: {e}")
+    
+    file_format = manifest.get("fileFormat") if manifest else None
+    if file_format not in ("CSV", "Parquet"):
+        if manifest:
+            print(f"⚠️ Unsupported inventory format {file_format}, listing bucket instead")
+        bucket = source_bucket or (manifest or {}).get("sourceBucket")
+        if not bucket:
+            print("❌ No inventory available and no source bucket to list")
+            return []
+        return get_all_s3_keys(s3_client, bucket, target_prefix, ext)
+    
+    if file_format == "CSV":
+        schema = [col.strip() for col in manifest["fileSchema"].split(",")]
+        key_column = f"s._{schema.index('Key') + 1}"
+    else:
+        key_column = 's."key"'
+    
+    keys = []
+    try:
+        for data_file in manifest["files"]:
+            keys.extend(_select_inventory_keys(
+                s3_client, inventory_bucket, data_file["key"], file_format, key_column, target_prefix, ext
+            ))
+    except ClientError as e:
+        print(f"❌ Error querying inventory: {e}")
+        return []
+    
+    keys.sort()
     return keys
 
 
@@ -155,6 +443,9 @@ def test_s3_access(bucket_name: str = 'nasa-disasters') -> bool:
     """
     Quick test to check if S3 access is configured properly.
     
+    A successful check is cached per bucket; failures are re-tested on the next
+    call. Use test_s3_access.cache_clear() to force a fresh check.
+    
     Args:
         bucket_name: Name of the bucket to test
     
@@ -162,11 +453,23 @@ def test_s3_access(bucket_name: str = 'nasa-disasters') -> bool:
         True if access is working, False otherwise
     """
     try:
-        s3_client = boto3.client('s3')
+        return _cached_access(bucket_name)
+    except _UncachedFailure:
+        return False
+
+
+@functools.lru_cache(maxsize=16)
+def _cached_access(bucket_name: str) -> bool:
+    """Run the head_bucket probe for `test_s3_access` (memoized; failures raise _UncachedFailure)."""
+    try:
+        s3_client = boto3.client('s3', config=S3_CLIENT_CONFIG)
         s3_client.head_bucket(Bucket=bucket_name)
         return True
-    except Exception:
-        return False
+    except Exception as e:
+        raise _UncachedFailure(bucket_name) from e
+
+
+test_s3_access.cache_clear = _cached_access.cache_clear
 
 
 if __name__ == "__main__":
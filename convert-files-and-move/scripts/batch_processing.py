@@ -4,19 +4,44 @@ Batch processing utilities for COG conversion and file processing.
 
 This module provides functions for:
 - Batch processing lists of files with custom processing functions
+- Prefetching source files from S3 into a local cache
 - Automatic metadata generation and saving
 - CSV logging of processed files
 """
 
+import io
 import os
-import json
-import tempfile
+import inspect
+import logging
+import numpy as np
 import pandas as pd
 import rasterio
 import boto3
+from boto3.s3.transfer import TransferConfig, create_transfer_manager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import List, Callable, Dict, Optional, Any
 
+from json_utils import dumps
+
+try:
+    from tqdm.auto import tqdm
+except ImportError:
+    tqdm = None
+
+logger = logging.getLogger(__name__)
+
+
+# GDAL settings shared by every file in a batch: merge adjacent range requests and
+# keep a per-file VSI cache large enough to reuse COG headers and overviews.
+# rasterio.Env requires GDAL_CACHEMAX as an integer (MB); the others are strings
+BATCH_GDAL_ENV = {
+    "GDAL_HTTP_MERGE_CONSECUTIVE_RANGES": "YES",
+    "VSI_CACHE": "TRUE",
+    "VSI_CACHE_SIZE": str(256 * 1024 * 1024),
+    "GDAL_CACHEMAX": 2048,
+}
+
 
 def process_file_batch(
     file_list: List[str],
@@ -27,7 +52,10 @@ def process_file_batch(
     event_name: str = None,
     save_metadata: bool = True,
     save_csv: bool = True,
-    verbose: bool = True
+    verbose: bool = True,
+    max_workers: int = 16,
+    data_download_dir: Optional[str] = None,
+    presorted: bool = False
 ) -> pd.DataFrame:
     """
     Process a batch of files with a custom processing function.
@@ -41,18 +69,24 @@ def process_file_batch(
             - cog_data_prefix: Target S3 prefix
             - local_output_dir: Optional local output directory
         filename_creator_func: Function to create output filename
-        processing_func: Function to process each file
+        processing_func: Function to process each file. If it accepts an
+            `s3_client` keyword, the batch's client is passed to it.
         event_name: Event name for filename creation (optional)
         save_metadata: Whether to save metadata to S3
         save_csv: Whether to save CSV log to S3
-        verbose: Whether to print progress messages
+        verbose: Whether to show a progress bar and status messages (per-file
+            details are logged at DEBUG level)
+        max_workers: Number of files processed concurrently (1 processes them
+            sequentially). processing_func must be safe to call from threads.
+        data_download_dir: If set, download every source file into this cache
+            directory (at data_download_dir/<key>) before processing starts,
+            so processing_func can read from the local cache
+        presorted: Set when file_list is already in lexicographic order (e.g. the
+            output of get_all_s3_keys) to skip re-sorting it
     
     Returns:
         DataFrame containing processed file information
     """
-    # Initialize DataFrame to track processed files
-    files_processed = pd.DataFrame(columns=["file_name", "COGs_created"])
-    
     # Get configuration values
     raw_data_bucket = config.get("raw_data_bucket")
     cog_data_bucket = config.get("cog_data_bucket")
@@ -65,9 +99,24 @@ def process_file_batch(
         if verbose:
             print(f"✅ Local output directory ready: {local_output_dir}")
     
-    # Process each file
-    total_files = len(file_list)
-    for idx, name in enumerate(sorted(file_list), 1):
+    # Enter the GDAL environment once up front: a bad setting should fail the batch
+    # here, not be caught per file and turn every file into an error record
+    with rasterio.Env(**BATCH_GDAL_ENV):
+        pass
+    
+    # Pipeline all source downloads up front so per-file work hits the local cache
+    if data_download_dir and s3_client:
+        prefetch_files(file_list, s3_client, raw_data_bucket, data_download_dir, verbose)
+    
+    ordered_files = file_list if presorted else sorted(file_list)
+    total_files = len(ordered_files)
+    
+    # Hand the shared client to processing functions that accept one
+    processing_kwargs = {}
+    if "s3_client" in inspect.signature(processing_func).parameters:
+        processing_kwargs["s3_client"] = s3_client
+    
+    def process_one(idx: int, name: str) -> Dict[str, str]:
         try:
             # Create output filename
             if event_name:
@@ -75,35 +124,55 @@ def process_file_batch(
             else:
                 cog_filename = filename_creator_func(name)
             
-            if verbose:
-                print(f"\n[{idx}/{total_files}] Processing: {name}")
-                print(f"   Output filename: {cog_filename}")
+            logger.debug("[%d/%d] Processing: %s -> %s", idx, total_files, name, cog_filename)
             
-            # Process the file
-            processing_func(
-                name, 
-                cog_filename, 
-                cog_data_bucket, 
-                cog_data_prefix, 
-                local_output_dir
-            )
+            # Process the file (rasterio.Env is thread-local, so each worker enters it)
+            with rasterio.Env(**BATCH_GDAL_ENV):
+                processing_func(
+                    name, 
+                    cog_filename, 
+                    cog_data_bucket, 
+                    cog_data_prefix, 
+                    local_output_dir,
+                    **processing_kwargs
+                )
             
-            # Add to tracking DataFrame
-            files_processed = files_processed._append(
-                {"file_name": name, "COGs_created": cog_filename},
-                ignore_index=True,
-            )
+            logger.debug("Generated and saved COG: %s", cog_filename)
             
-            if verbose:
-                print(f"   ✅ Generated and saved COG: {cog_filename}")
+            return {"file_name": name, "COGs_created": cog_filename}
                 
         except Exception as e:
-            print(f"   ❌ Error processing {name}: {str(e)}")
+            logger.error("❌ Error processing %s: %s", name, e)
             # Optionally add failed file to DataFrame with error status
-            files_processed = files_processed._append(
-                {"file_name": name, "COGs_created": f"ERROR: {str(e)[:100]}"},
-                ignore_index=True,
-            )
+            return {"file_name": name, "COGs_created": f"ERROR: {str(e)[:100]}"}
+    
+    # Process files concurrently; the work is dominated by S3 transfers
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {
+            executor.submit(process_one, idx, name): idx
+            for idx, name in enumerate(ordered_files, 1)
+        }
+        pbar = tqdm(total=total_files, unit="file", disable=not verbose) if tqdm else None
+        for future in as_completed(futures):
+            idx = futures[future]
+            results[idx] = future.result()
+            if pbar is not None:
+                pbar.update(1)
+                pbar.set_postfix_str(os.path.basename(ordered_files[idx - 1]))
+        if pbar is not None:
+            pbar.close()
+    
+    # Keep records in input order regardless of completion order
+    records = [results[idx] for idx in sorted(results)]
+    
+    files_processed = pd.DataFrame.from_records(records, columns=["file_name", "COGs_created"])
+    try:
+        # Arrow-backed strings make the 'ERROR:' prefix scans run in C
+        files_processed["COGs_created"] = files_processed["COGs_created"].astype(pd.StringDtype("pyarrow"))
+    except ImportError:
+        pass
+    error_mask = _error_mask(files_processed)
     
     if verbose:
         print(f"\n✅ Batch processing complete: {len(files_processed)} files processed")
@@ -116,7 +185,9 @@ def process_file_batch(
             raw_data_bucket, 
             cog_data_bucket, 
             cog_data_prefix,
-            verbose
+            verbose,
+            local_output_dir,
+            error_mask
         )
     
     # Save CSV log if requested
@@ -136,41 +207,115 @@ def process_file_batch(
     return files_processed
 
 
+def _error_mask(files_processed: pd.DataFrame) -> np.ndarray:
+    """Return a boolean array marking rows whose COGs_created holds an 'ERROR:' entry."""
+    return files_processed['COGs_created'].str.startswith('ERROR:', na=False).to_numpy(dtype=bool)
+
+
+def prefetch_files(
+    file_list: List[str],
+    s3_client: boto3.client,
+    raw_data_bucket: str,
+    data_download_dir: str = "data_download",
+    verbose: bool = True
+) -> int:
+    """
+    Download source files into the local cache using a single S3 transfer manager.
+    
+    Files are stored at data_download_dir/<key>; files already in the cache are skipped.
+    
+    Args:
+        file_list: List of S3 keys to download
+        s3_client: Initialized boto3 S3 client
+        raw_data_bucket: Source S3 bucket name
+        data_download_dir: Directory path for cached downloads
+        verbose: Whether to print progress messages
+    
+    Returns:
+        Number of files downloaded
+    """
+    transfer_config = TransferConfig(
+        max_concurrency=32,
+        multipart_chunksize=8 * 1024 * 1024,
+        use_threads=True,
+    )
+    
+    futures = {}
+    with create_transfer_manager(s3_client, transfer_config) as manager:
+        for name in file_list:
+            local_path = os.path.join(data_download_dir, name)
+            if os.path.exists(local_path):
+                continue
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            futures[name] = manager.download(raw_data_bucket, name, local_path)
+        
+        downloaded = 0
+        for name, future in futures.items():
+            try:
+                future.result()
+                downloaded += 1
+            except Exception as e:
+                # Leave it to processing_func to retry the download
+                print(f"   ⚠️ Prefetch failed for {name}: {str(e)}")
+    
+    if verbose:
+        print(f"📥 Prefetched {downloaded} files into {data_download_dir}/ "
+              f"({len(file_list) - len(futures)} already cached)")
+    
+    return downloaded
+
+
 def save_processing_metadata(
     files_processed: pd.DataFrame,
     s3_client: boto3.client,
     raw_data_bucket: str,
     cog_data_bucket: str,
     cog_data_prefix: str,
-    verbose: bool = True
+    verbose: bool = True,
+    local_output_dir: Optional[str] = None,
+    error_mask: Optional[np.ndarray] = None
 ) -> None:
     """
     Save metadata from processed files to S3.
     
+    Metadata is read from the first COG written by the batch: the local copy in
+    local_output_dir if present, otherwise the uploaded COG via GDAL's /vsis3/
+    (which only range-reads the header).
+    
     Args:
         files_processed: DataFrame with processed file information
         s3_client: Initialized boto3 S3 client
-        raw_data_bucket: Source S3 bucket name
+        raw_data_bucket: Source S3 bucket name (no longer read; kept for compatibility)
         cog_data_bucket: Target S3 bucket name
         cog_data_prefix: Target S3 prefix
         verbose: Whether to print progress messages
+        local_output_dir: Local directory the COGs were saved to (optional)
+        error_mask: Precomputed result of _error_mask(files_processed) (optional)
     """
     try:
         # Get first successfully processed file (not an error)
-        successful_files = files_processed[~files_processed['COGs_created'].str.startswith('ERROR:', na=False)]
+        if error_mask is None:
+            error_mask = _error_mask(files_processed)
+        successful_files = files_processed[~error_mask]
         
         if len(successful_files) == 0:
             if verbose:
                 print("⚠️ No successfully processed files to extract metadata from")
             return
         
-        sample_file = successful_files.iloc[0]['file_name']
-        temp_sample_file = f"temp_{os.path.basename(sample_file)}"
+        cog_filename = successful_files.iloc[0]['COGs_created']
+        local_cog = os.path.join(local_output_dir, cog_filename) if local_output_dir else None
         
-        # Download sample file to extract metadata
-        s3_client.download_file(raw_data_bucket, sample_file, temp_sample_file)
+        if local_cog and os.path.exists(local_cog):
+            cog_path = local_cog
+        else:
+            cog_path = f"/vsis3/{cog_data_bucket}/{cog_data_prefix}/{cog_filename}"
         
-        with rasterio.open(temp_sample_file) as src:
+        with rasterio.Env(
+            AWS_HTTPS='YES',
+            GDAL_DISABLE_READDIR_ON_OPEN='EMPTY_DIR',
+            CPL_VSIL_CURL_ALLOWED_EXTENSIONS='.tif'
+        ), rasterio.open(cog_path) as src:
             metadata = {
                 "description": src.tags(),
                 "driver": src.driver,
@@ -187,26 +332,16 @@ def save_processing_metadata(
                 "processing_timestamp": pd.Timestamp.now().isoformat()
             }
         
-        # Upload metadata
-        with tempfile.NamedTemporaryFile(mode="w+", suffix=".json", delete=False) as fp:
-            json.dump(metadata, fp, indent=2)
-            fp.flush()
-            
-            s3_client.upload_file(
-                Filename=fp.name,
-                Bucket=cog_data_bucket,
-                Key=f"{cog_data_prefix}/metadata.json",
-            )
-            
-            # Clean up temp file
-            os.unlink(fp.name)
+        # Upload metadata straight from memory
+        s3_client.put_object(
+            Bucket=cog_data_bucket,
+            Key=f"{cog_data_prefix}/metadata.json",
+            Body=dumps(metadata, indent=True),
+            ContentType="application/json",
+        )
             
         if verbose:
             print(f"📊 Uploaded metadata to s3://{cog_data_bucket}/{cog_data_prefix}/metadata.json")
-        
-        # Clean up sample file
-        if os.path.exists(temp_sample_file):
-            os.remove(temp_sample_file)
             
     except Exception as e:
         print(f"❌ Error saving metadata: {str(e)}")
@@ -230,18 +365,15 @@ def save_processing_csv(
         verbose: Whether to print progress messages
     """
     try:
-        with tempfile.NamedTemporaryFile(mode="w+", suffix=".csv", delete=False) as fp:
-            files_processed.to_csv(fp.name, index=False)
-            fp.flush()
-            
-            s3_client.upload_file(
-                Filename=fp.name,
-                Bucket=cog_data_bucket,
-                Key=f"{cog_data_prefix}/files_converted.csv",
-            )
-            
-            # Clean up temp file
-            os.unlink(fp.name)
+        buffer = io.BytesIO()
+        files_processed.to_csv(buffer, index=False)
+        
+        s3_client.put_object(
+            Bucket=cog_data_bucket,
+            Key=f"{cog_data_prefix}/files_converted.csv",
+            Body=buffer.getvalue(),
+            ContentType="text/csv",
+        )
             
         if verbose:
             print(f"📝 Saved processing log to s3://{cog_data_bucket}/{cog_data_prefix}/files_converted.csv")
@@ -250,18 +382,21 @@ def save_processing_csv(
         print(f"❌ Error saving CSV log: {str(e)}")
 
 
-def create_batch_summary(files_processed: pd.DataFrame) -> Dict[str, Any]:
+def create_batch_summary(files_processed: pd.DataFrame, error_mask: Optional[np.ndarray] = None) -> Dict[str, Any]:
     """
     Create a summary of the batch processing results.
     
     Args:
         files_processed: DataFrame with processed file information
+        error_mask: Precomputed result of _error_mask(files_processed) (optional)
     
     Returns:
         Dictionary containing summary statistics
     """
-    successful = len(files_processed[~files_processed['COGs_created'].str.startswith('ERROR:', na=False)])
-    failed = len(files_processed[files_processed['COGs_created'].str.startswith('ERROR:', na=False)])
+    if error_mask is None:
+        error_mask = _error_mask(files_processed)
+    failed = int(np.count_nonzero(error_mask))
+    successful = len(files_processed) - failed
     
     summary = {
         "total_files": len(files_processed),
@@ -3,14 +3,37 @@
 Utilities for COG (Cloud Optimized GeoTIFF) validation and cache management.
 
 This module provides functions for:
-- Validating Cloud Optimized GeoTIFF files
+- Validating Cloud Optimized GeoTIFF files (with a persistent result cache)
 - Managing download cache for S3 files
 - Checking cache status and clearing cache
 """
 
 import os
+import copy
+import atexit
+import pickle
 import shutil
-from typing import Tuple, Dict, List, Optional
+import tempfile
+import functools
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Tuple, Dict, List, Optional
+
+
+VALIDATE_COG_CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "cog_validate", "validate_cog.pkl"
+)
+
+
+def _iter_tif(root: str):
+    """Yield (path, size) for every .tif file below `root`, using os.scandir's cached stats."""
+    with os.scandir(root) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _iter_tif(entry.path)
+            elif entry.name[-4:] == '.tif':
+                yield entry.path, entry.stat().st_size
 
 
 def check_cache_status(data_download_dir: str = "data_download") -> Tuple[int, int]:
@@ -30,19 +53,26 @@ def check_cache_status(data_download_dir: str = "data_download") -> Tuple[int, i
         print(f"✅ Cache directory created: {data_download_dir}/")
         return 0, 0
     
-    # Count files and calculate total size
-    total_files = 0
-    total_size = 0
+    # Count files and calculate total size; subdirectories are scanned in parallel
     file_list = []
+    top_dirs = []
+    with os.scandir(data_download_dir) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                top_dirs.append(entry.path)
+            elif entry.name[-4:] == '.tif':
+                file_list.append((entry.path, entry.stat().st_size))
     
-    for root, dirs, files in os.walk(data_download_dir):
-        for file in files:
-            if file.endswith('.tif'):
-                file_path = os.path.join(root, file)
-                file_size = os.path.getsize(file_path)
-                total_files += 1
-                total_size += file_size
-                file_list.append((file_path.replace(data_download_dir + '/', ''), file_size))
+    if top_dirs:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [executor.submit(list, _iter_tif(d)) for d in top_dirs]
+            for future in as_completed(futures):
+                file_list.extend(future.result())
+    
+    prefix = data_download_dir + '/'
+    file_list = [(path.replace(prefix, ''), size) for path, size in file_list]
+    total_files = len(file_list)
+    total_size = sum(size for _, size in file_list)
     
     print(f"📊 Cache Status:")
     print(f"  - Directory: {data_download_dir}/")
@@ -81,10 +111,147 @@ def clear_cache(confirm: bool = False, data_download_dir: str = "data_download")
     print(f"✅ Cache cleared: {data_download_dir}/ removed")
 
 
+# Bump whenever validate_cog's checks or result format change, so cached results are not reused
+VALIDATE_COG_SCHEMA_VERSION = 2
+
+
+@functools.lru_cache(maxsize=None)
+def _validator_versions() -> Tuple:
+    """Return the versions that decide validate_cog's result for an unchanged file."""
+    import rasterio
+    try:
+        import rio_cogeo
+        rio_cogeo_version = rio_cogeo.__version__
+    except ImportError:
+        # validate_cog records the missing package as a validation error
+        rio_cogeo_version = None
+    return (
+        rasterio.__version__,
+        rasterio.__gdal_version__,
+        rio_cogeo_version,
+        VALIDATE_COG_SCHEMA_VERSION,
+    )
+
+
+def _stat_lru_cache(maxsize: int = 4096, cache_path: str = VALIDATE_COG_CACHE_PATH,
+                    save_every: int = 64, versions: Callable[[], Tuple] = _validator_versions) -> Callable:
+    """
+    Memoize a single-argument file validator on the file's identity.
+    
+    Results are keyed by (absolute path, mtime_ns, size) plus the tuple returned
+    by `versions` (rasterio, GDAL and rio-cogeo versions and the result schema
+    version by default) and kept in an LRU that is also pickled to `cache_path`, so reruns
+    skip files that have not changed. The pickle is rewritten after every
+    `save_every` new entries and at interpreter exit, not on every miss. Paths
+    that can't be stat'ed (e.g. remote URLs) or that live in the system temp
+    directory are never cached, nor are results that ended in an exception.
+    """
+    temp_dir = os.path.join(os.path.abspath(tempfile.gettempdir()), '')
+    
+    def decorator(func: Callable[[str], Tuple[bool, Dict]]) -> Callable[[str], Tuple[bool, Dict]]:
+        entries = None
+        unsaved = 0
+        lock = threading.Lock()
+        
+        def load_entries() -> OrderedDict:
+            try:
+                with open(cache_path, 'rb') as f:
+                    loaded = pickle.load(f)
+                if isinstance(loaded, OrderedDict):
+                    return loaded
+            except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+                pass
+            return OrderedDict()
+        
+        def save_entries() -> None:
+            try:
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    pickle.dump(entries, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, cache_path)
+            except OSError:
+                pass
+        
+        def cache_flush() -> None:
+            """Write pending entries to `cache_path` now."""
+            nonlocal unsaved
+            with lock:
+                if unsaved:
+                    save_entries()
+                    unsaved = 0
+        
+        @functools.wraps(func)
+        def wrapper(filepath: str) -> Tuple[bool, Dict]:
+            nonlocal entries, unsaved
+            
+            try:
+                st = os.stat(filepath)
+                abspath = os.path.abspath(filepath)
+            except (OSError, TypeError, ValueError):
+                return func(filepath)
+            
+            # Scratch files are validated once and deleted; caching them only bloats the pickle
+            if abspath.startswith(temp_dir):
+                return func(filepath)
+            
+            key = (abspath, st.st_mtime_ns, st.st_size) + versions()
+            
+            with lock:
+                if entries is None:
+                    entries = load_entries()
+                if key in entries:
+                    entries.move_to_end(key)
+                    return copy.deepcopy(entries[key])
+            
+            result = func(filepath)
+            if any(err.startswith("Validation error:") for err in result[1].get('errors', [])):
+                return result
+            
+            with lock:
+                entries[key] = copy.deepcopy(result)
+                while len(entries) > maxsize:
+                    entries.popitem(last=False)
+                unsaved += 1
+                if unsaved >= save_every:
+                    save_entries()
+                    unsaved = 0
+            
+            return result
+        
+        def cache_clear() -> None:
+            nonlocal entries, unsaved
+            with lock:
+                entries = OrderedDict()
+                unsaved = 0
+                try:
+                    os.remove(cache_path)
+                except OSError:
+                    pass
+        
+        atexit.register(cache_flush)
+        wrapper.cache_clear = cache_clear
+        wrapper.cache_flush = cache_flush
+        return wrapper
+    
+    return decorator
+
+
+@_stat_lru_cache(maxsize=4096)
 def validate_cog(filepath: str) -> Tuple[bool, Dict]:
     """
     Validate that a file is a proper Cloud Optimized GeoTIFF.
     
+    Validity is decided by rio-cogeo's cog_validate (strict mode), which checks
+    the GDAL-level COG layout (IFD ordering, tiling, overviews). The remaining
+    details are read from the file header for reporting. rio-cogeo is optional:
+    without it every file is reported invalid with a "Validation error:" entry
+    (which is not cached), rather than raising ImportError.
+    
+    Results for local files are cached on (path, mtime, size); call
+    validate_cog.cache_clear() to force re-validation, or
+    validate_cog.cache_flush() to persist new results before exit.
+    
     Args:
         filepath: Path to the file to validate
     
@@ -103,11 +270,20 @@ def validate_cog(filepath: str) -> Tuple[bool, Dict]:
         'overview_levels': [],
         'compression': None,
         'driver': None,
-        'errors': []
+        'errors': [],
+        'warnings': []
+    }
+    
+    # Header-only reads, also when validating over /vsis3/ or /vsicurl/
+    gdal_config = {
+        'GDAL_DISABLE_READDIR_ON_OPEN': 'EMPTY_DIR',
+        'CPL_VSIL_CURL_USE_HEAD': 'NO',
     }
     
     try:
-        with Env(GDAL_DISABLE_READDIR_ON_OPEN='EMPTY_DIR'):
+        from rio_cogeo.cogeo import cog_validate
+        
+        with Env(**gdal_config):
             with rasterio.open(filepath) as src:
                 # Check driver
                 validation_details['driver'] = src.driver
@@ -117,49 +293,25 @@ def validate_cog(filepath: str) -> Tuple[bool, Dict]:
                     validation_details['errors'].append(f"Invalid driver: {src.driver}, expected GTiff or COG")
                     return False, validation_details
                 
-                # Check for tiling
                 if src.profile.get('tiled', False):
                     validation_details['has_tiles'] = True
                     validation_details['tile_size'] = (
                         src.profile.get('blockxsize', 0),
                         src.profile.get('blockysize', 0)
                     )
-                else:
-                    validation_details['errors'].append("File is not tiled")
                 
-                # Check for overviews
                 overviews = src.overviews(1)  # Check band 1
-                if overviews:
-                    validation_details['has_overviews'] = True
-                    validation_details['overview_levels'] = overviews
-                else:
-                    validation_details['errors'].append("No overviews found")
-                
-                # Check compression
-                compression = src.profile.get('compress', None)
-                validation_details['compression'] = compression
-                if compression not in ['DEFLATE', 'LZW', 'ZSTD', 'WEBP', 'JPEG']:
-                    validation_details['errors'].append(f"Compression '{compression}' may not be optimal for COG")
-                
-                # Check if file structure is cloud optimized
-                # A COG should have IFD (Image File Directory) offsets arranged properly
-                # This is a simplified check - true COG validation would check IFD ordering
-                is_likely_cog = (
-                    validation_details['has_tiles'] and 
-                    validation_details['has_overviews'] and
-                    validation_details['compression'] in ['DEFLATE', 'LZW', 'ZSTD', 'WEBP', 'JPEG']
-                )
-                
-                validation_details['is_cog'] = is_likely_cog
-                
-                # Additional check for internal structure
-                if hasattr(src, 'is_tiled') and src.is_tiled:
-                    # Check tile size is reasonable (typically 256 or 512)
-                    tile_x, tile_y = validation_details['tile_size']
-                    if tile_x not in [256, 512, 1024] or tile_y not in [256, 512, 1024]:
-                        validation_details['errors'].append(f"Non-standard tile size: {tile_x}x{tile_y}")
-                
-                return is_likely_cog, validation_details
+                validation_details['has_overviews'] = bool(overviews)
+                validation_details['overview_levels'] = overviews
+                validation_details['compression'] = src.profile.get('compress', None)
+            
+            is_valid, errors, warnings = cog_validate(filepath, strict=True, config=gdal_config, quiet=True)
+        
+        validation_details['is_cog'] = is_valid
+        validation_details['errors'].extend(errors)
+        validation_details['warnings'].extend(warnings)
+        
+        return is_valid, validation_details
                 
     except Exception as e:
         validation_details['errors'].append(f"Validation error: {str(e)}")
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+JSON helpers that use orjson when it is installed and fall back to the stdlib.
+
+This module provides functions for:
+- Parsing JSON from bytes or str
+- Serializing objects to (optionally indented) UTF-8 JSON bytes
+"""
+
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """
+    Parse a JSON document.
+    
+    Args:
+        data: JSON document as bytes or str
+    
+    Returns:
+        The parsed Python object
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any, indent: bool = False) -> bytes:
+    """
+    Serialize an object to JSON.
+    
+    Args:
+        obj: Object to serialize
+        indent: If True, pretty-print with a 2-space indent
+    
+    Returns:
+        UTF-8 encoded JSON bytes
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, option=option)
+    return json.dumps(obj, indent=2 if indent else None).encode("utf-8")
@@ -4,19 +4,86 @@ Module for loading and querying DRCS TIF files from pre-analyzed S3 crawler data
 
 This module provides functions to:
 - Load DRCS activation data from JSON files
-- Query TIF files from specific directory paths
+- Query TIF files from specific directory paths (in memory or stream-parsed)
+- Index every directory path once for constant-time lookups
 - List available directories at any level
 """
 
-import json
+import logging
+import os
+import pickle
 from pathlib import Path
-from typing import List, Dict, Optional, Union
+from typing import List, Dict, Optional, Tuple, Union
+
+from json_utils import loads
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+
+logger = logging.getLogger(__name__)
+
+# Keys in a DRCS directory node that are not child directories
+_SPECIAL_KEYS = frozenset(('_files', '_metadata'))
+
+# (mtime_ns, parsed DRCS data) per resolved path, shared by every helper in this module;
+# a newer mtime replaces the entry rather than adding one
+_DRCS_CACHE: Dict[str, Tuple[int, Dict]] = {}
+
+
+def clear_drcs_cache() -> None:
+    """Drop the in-memory DRCS data so the next load re-reads the file."""
+    _DRCS_CACHE.clear()
+
+
+def _load_drcs_cached(path: Path) -> Dict:
+    """
+    Load a DRCS JSON file, reusing a pickled copy of the parsed data when it is fresh.
+    
+    The pickle sits next to the JSON (same name, .pkl suffix) and stores the JSON's
+    size with the data. It is only used if it is at least as new as the JSON and the
+    size still matches; otherwise the JSON is parsed and the pickle rewritten.
+    """
+    cache_path = path.with_suffix('.pkl')
+    json_stat = path.stat()
+    
+    try:
+        if cache_path.stat().st_mtime >= json_stat.st_mtime:
+            with open(cache_path, 'rb') as f:
+                cached = pickle.load(f)
+            if isinstance(cached, tuple) and len(cached) == 2 and cached[0] == json_stat.st_size:
+                return cached[1]
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        pass
+    
+    drcs_data = loads(path.read_bytes())
+    
+    # Write to a temporary file and swap it in, so an interrupted or concurrent
+    # run never leaves a truncated pickle behind
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((json_stat.st_size, drcs_data), f, protocol=5)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # Read-only location; just skip caching
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+    
+    return drcs_data
 
 
 def load_drcs_data(json_path: Union[str, Path] = None) -> Optional[Dict]:
     """
     Load the pre-analyzed DRCS TIF files data from JSON.
     
+    Parsed data is kept in memory and returned as-is on later calls for the same
+    unchanged file; use clear_drcs_cache() to force a reload.
+    
     Args:
         json_path: Path to the drcs_activations_tif_files.json file.
                   If None, tries common locations.
@@ -24,6 +91,24 @@ def load_drcs_data(json_path: Union[str, Path] = None) -> Optional[Dict]:
     Returns:
         Dictionary containing DRCS data or None if not found
     """
+    path = _find_drcs_json(json_path)
+    if path is None:
+        return None
+    
+    key = str(path.resolve())
+    mtime_ns = path.stat().st_mtime_ns
+    cached = _DRCS_CACHE.get(key)
+    if cached is not None and cached[0] == mtime_ns:
+        return cached[1]
+    
+    drcs_data = _load_drcs_cached(path)
+    _DRCS_CACHE[key] = (mtime_ns, drcs_data)
+    print(f"✅ Loaded DRCS data from {path}")
+    return drcs_data
+
+
+def _find_drcs_json(json_path: Union[str, Path] = None) -> Optional[Path]:
+    """Return the first existing DRCS JSON path (json_path or the common locations)."""
     if json_path is None:
         # Try common locations
         possible_paths = [
@@ -37,19 +122,122 @@ def load_drcs_data(json_path: Union[str, Path] = None) -> Optional[Dict]:
     
     for path in possible_paths:
         if path.exists():
-            with open(path, 'r') as f:
-                drcs_data = json.load(f)
-            print(f"✅ Loaded DRCS data from {path}")
-            return drcs_data
+            return path
     
-    print(f"⚠️ DRCS data file not found. Tried paths: {possible_paths}")
+    logger.warning("⚠️ DRCS data file not found. Tried paths: %s", possible_paths)
     return None
 
 
+def stream_tif_files_from_path(path_old: str,
+                               dir_base: str = 'drcs_activations',
+                               json_path: Union[str, Path] = None) -> Tuple[str, ...]:
+    """
+    Extract .tif files for a single path by stream-parsing the DRCS JSON with ijson.
+    
+    Only the requested '_files' array is materialized and parsing stops as soon as
+    it has been read, so this is the cheaper choice for one-off lookups. When many
+    paths will be queried, load the data once with load_drcs_data() and use
+    get_tif_files_from_path() instead. Falls back to that full-load path if ijson
+    is not installed.
+    
+    Args:
+        path_old: Path like 'drcs_activations/202405_Flood_TX/planet'
+        dir_base: Base directory name to strip from path (default: 'drcs_activations')
+        json_path: Path to JSON file (if None, tries common locations)
+    
+    Returns:
+        Tuple of .tif filenames found in that directory
+    """
+    if ijson is None:
+        return get_tif_files_from_path(path_old, None, dir_base, json_path)
+    
+    path = _find_drcs_json(json_path)
+    if path is None:
+        return ()
+    
+    target = ['drcs_activations'] + [p for p in path_old.replace(dir_base, '').strip('/').split('/') if p]
+    target.append('_files')
+    
+    # Track the key path ourselves: ijson's dotted prefixes are ambiguous for keys containing '.'
+    keys = []
+    files = []
+    collecting = False
+    with open(path, 'rb') as f:
+        for event, value in ijson.basic_parse(f):
+            if event == 'start_map' or event == 'start_array':
+                if event == 'start_array' and keys == target:
+                    collecting = True
+                keys.append(None)
+            elif event == 'map_key':
+                keys[-1] = value
+            elif event == 'end_map' or event == 'end_array':
+                keys.pop()
+                if collecting:
+                    return tuple(files)
+            elif collecting and event == 'string':
+                files.append(value)
+    
+    logger.warning("⚠️ No files found in: %s", path_old)
+    return ()
+
+
+def build_path_index(drcs_data: Dict,
+                     dir_index: Optional[Dict[str, Tuple[str, ...]]] = None) -> Dict[str, Tuple[str, ...]]:
+    """
+    Walk the DRCS tree once and map each directory path to its '_files' entries.
+    
+    The walk uses an explicit stack, so arbitrarily deep trees are fine.
+    
+    Args:
+        drcs_data: The loaded DRCS JSON data
+        dir_index: Optional dictionary to fill during the same walk with each
+            directory path mapped to a sorted tuple of its child directory names
+    
+    Returns:
+        Dictionary mapping paths relative to 'drcs_activations'
+        (e.g. '202405_Flood_TX/planet') to a tuple of their .tif filenames
+    """
+    index = {}
+    stack = [('', drcs_data['drcs_activations'])]
+    
+    while stack:
+        path, node = stack.pop()
+        if dir_index is not None:
+            dir_index[path] = tuple(sorted(k for k in node if k not in _SPECIAL_KEYS))
+        for key, value in node.items():
+            if key == '_files':
+                index[path] = tuple(value)
+            elif key != '_metadata' and isinstance(value, dict):
+                stack.append((f"{path}/{key}" if path else key, value))
+    
+    return index
+
+
+def _build_indexes(drcs_data: Dict) -> None:
+    """Build the path and directory indexes for drcs_data and cache them on it."""
+    dir_index = {}
+    drcs_data['__path_index__'] = build_path_index(drcs_data, dir_index)
+    drcs_data['__dir_index__'] = dir_index
+
+
+def _path_index(drcs_data: Dict) -> Dict[str, Tuple[str, ...]]:
+    """Return the path index for drcs_data, building and caching it on first use."""
+    if '__path_index__' not in drcs_data:
+        _build_indexes(drcs_data)
+    return drcs_data['__path_index__']
+
+
+def _dir_index(drcs_data: Dict) -> Dict[str, Tuple[str, ...]]:
+    """Return the directory index for drcs_data, building and caching it on first use."""
+    if '__dir_index__' not in drcs_data:
+        _build_indexes(drcs_data)
+    return drcs_data['__dir_index__']
+
+
 def get_tif_files_from_path(path_old: str, 
                            drcs_data: Dict = None, 
                            dir_base: str = 'drcs_activations',
-                           json_path: Union[str, Path] = None) -> List[str]:
+                           json_path: Union[str, Path] = None) -> Tuple[str, ...]:
     """
     Extract .tif files from the specified path in DRCS data.
     
@@ -60,21 +248,28 @@ def get_tif_files_from_path(path_old: str,
         json_path: Path to JSON file if drcs_data is None
     
     Returns:
-        List of .tif filenames found in that directory
+        Tuple of .tif filenames found in that directory; tuples from the path
+        index are shared between calls, which is why they are immutable
     """
     # Load data if not provided
     if drcs_data is None:
         drcs_data = load_drcs_data(json_path)
     
     if not drcs_data or 'drcs_activations' not in drcs_data:
-        return []
+        return ()
     
-    # Parse the path
-    path_parts = path_old.replace(dir_base, '').strip('/').split('/')
+    # Fast path: single lookup in the path index (built once per drcs_data)
+    normalized = path_old.replace(dir_base, '').strip('/')
+    tif_files = _path_index(drcs_data).get(normalized)
+    if tif_files is not None:
+        return tif_files
+    
+    # Slow path: walk the tree to report where the path breaks off
+    path_parts = normalized.split('/')
     
     if len(path_parts) < 1:
-        print(f"⚠️ Invalid path: {path_old}")
-        return []
+        logger.warning("⚠️ Invalid path: %s", path_old)
+        return ()
     
     # Navigate through the JSON structure
     current = drcs_data['drcs_activations']
@@ -83,63 +278,73 @@ def get_tif_files_from_path(path_old: str,
         if part and part in current:
             current = current[part]
         else:
-            print(f"⚠️ Directory '{part}' not found in path: {path_old}")
+            logger.warning("⚠️ Directory '%s' not found in path: %s", part, path_old)
             
-            # Suggest available directories
-            if isinstance(current, dict):
-                available = [k for k in current.keys() if k not in ['_files', '_metadata']]
+            # Suggest available directories (only worth building if it will be shown)
+            if isinstance(current, dict) and logger.isEnabledFor(logging.WARNING):
+                available = [k for k in current.keys() if k not in _SPECIAL_KEYS]
                 if available:
-                    print(f"   Available directories at this level: {', '.join(available[:5])}")
+                    logger.warning("   Available directories at this level: %s", ', '.join(available[:5]))
                     if len(available) > 5:
-                        print(f"   ... and {len(available) - 5} more")
-            return []
+                        logger.warning("   ... and %d more", len(available) - 5)
+            return ()
     
     # Get files if they exist
     if isinstance(current, dict) and '_files' in current:
-        return current['_files']
+        return tuple(current['_files'])
     else:
-        print(f"⚠️ No files found in: {path_old}")
-        return []
+        logger.warning("⚠️ No files found in: %s", path_old)
+        return ()
 
 
 def list_available_directories(base_path: str = 'drcs_activations',
                               drcs_data: Dict = None,
-                              json_path: Union[str, Path] = None) -> List[str]:
+                              json_path: Union[str, Path] = None) -> Tuple[str, ...]:
     """
     List all available directories at a given path level.
     
+    Listings under 'drcs_activations' come pre-sorted from a directory index
+    built once per dataset, so repeated calls are a dictionary lookup.
+    
     Args:
         base_path: Path to list directories from (e.g., 'drcs_activations/202405_Flood_TX')
         drcs_data: The loaded DRCS JSON data (if None, will load it)
         json_path: Path to JSON file if drcs_data is None
     
     Returns:
-        List of directory names available at that path
+        Sorted tuple of directory names available at that path
+        (shared with the index, so it is read-only)
     """
     # Load data if not provided
     if drcs_data is None:
         drcs_data = load_drcs_data(json_path)
     
     if not drcs_data or 'drcs_activations' not in drcs_data:
-        return []
+        return ()
     
-    # Navigate to the specified path
+    # Fast path: look the listing up in the directory index
     path_parts = base_path.strip('/').split('/')
+    if path_parts[0] == 'drcs_activations':
+        directories = _dir_index(drcs_data).get('/'.join(path_parts[1:]))
+        if directories is not None:
+            return directories
+    
+    # Navigate to the specified path
     current = drcs_data
     
     for part in path_parts:
         if part and part in current:
             current = current[part]
         else:
-            print(f"⚠️ Path not found: {base_path}")
-            return []
+            logger.warning("⚠️ Path not found: %s", base_path)
+            return ()
     
     # Get directories (exclude special keys)
     if isinstance(current, dict):
-        directories = [k for k in current.keys() if k not in ['_files', '_metadata']]
-        return sorted(directories)
+        directories = [k for k in current.keys() if k not in _SPECIAL_KEYS]
+        return tuple(sorted(directories))
     
-    return []
+    return ()
 
 
 def get_files_with_full_paths(path_old: str,
@@ -161,10 +366,48 @@ def get_files_with_full_paths(path_old: str,
     tif_files = get_tif_files_from_path(path_old, drcs_data, dir_base, json_path)
     
     if tif_files:
-        return [f"{path_old}/{file}" for file in tif_files]
+        prefix = path_old + "/"
+        return [prefix + file for file in tif_files]
     return []
 
 
+def get_files_with_full_paths_cached(path_old: str,
+                                    drcs_data: Dict = None,
+                                    dir_base: str = 'drcs_activations',
+                                    json_path: Union[str, Path] = None) -> Tuple[str, ...]:
+    """
+    Get .tif files with full S3-style paths prepended, computing them once per path.
+    
+    The result is cached on drcs_data, so repeated calls for the same path return
+    the same (immutable) tuple.
+    
+    Args:
+        path_old: Path like 'drcs_activations/202405_Flood_TX/planet'
+        drcs_data: The loaded DRCS JSON data (if None, will load it)
+        dir_base: Base directory name (default: 'drcs_activations')
+        json_path: Path to JSON file if drcs_data is None
+    
+    Returns:
+        Tuple of full paths like 'drcs_activations/202405_Flood_TX/planet/file.tif'
+    """
+    # Load data if not provided
+    if drcs_data is None:
+        drcs_data = load_drcs_data(json_path)
+    
+    if not drcs_data:
+        return ()
+    
+    cache = drcs_data.setdefault('__full_path_cache__', {})
+    key = (path_old, dir_base)
+    full_paths = cache.get(key)
+    if full_paths is None:
+        full_paths = tuple(get_files_with_full_paths(path_old, drcs_data, dir_base))
+        # Only cache hits, so a missing path keeps reporting why it was not found
+        if full_paths:
+            cache[key] = full_paths
+    return full_paths
+
+
 def main():
     """Main function for testing the module."""
     # Example usage
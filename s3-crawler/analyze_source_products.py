@@ -4,226 +4,381 @@ Analyze source products from DRCS activations TIF files.
 """
 
 import json
+import os
 import re
+import sys
+import functools
+import heapq
+import operator
 from collections import defaultdict
-from typing import Dict, Set, List, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Set, List, Optional, Tuple, Union
 
-def extract_source_products(data: Dict) -> Dict[str, List[str]]:
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Inputs larger than this are stream-parsed (when ijson is available) instead of loaded
+STREAM_THRESHOLD_BYTES = 200 * 1024 * 1024
+
+# Loaded inputs larger than this are analyzed one top-level event per process;
+# below it, process start-up and pickling the subtrees cost more than they save
+PARALLEL_THRESHOLD_BYTES = 50 * 1024 * 1024
+
+# Fewer top-level events than this are always analyzed serially
+PARALLEL_MIN_EVENTS = 4
+
+# Every substring the classifier looks for in a file name; if none occur, only the
+# parent directory can decide the source
+_FILE_TOKEN_RE = re.compile(
+    r"sentinel|s1|s2|landsat|lc08|le07|modis|viirs|vnp|vj1|master|aria|planet|maxar"
+    r"|hls|emit|ecostress|icesat|smap|gpm|imerg|goes|worldview|gedi"
+)
+
+# Directory names that decide the source on their own once no file-name rule matched.
+# "natural"/"falsecolor" map to None: they are processed products, not a source
+_DIR_SOURCE_MAP = {
+    "dnbr": "Burn Index Products (dNBR/NBR)",
+    "dnbr_v2": "Burn Index Products (dNBR/NBR)",
+    "nbr": "Burn Index Products (dNBR/NBR)",
+    "dem": "DEM (Digital Elevation Model)",
+    "elevation": "DEM (Digital Elevation Model)",
+    "flood_extent": "Flood/Water Products",
+    "flood": "Flood/Water Products",
+    "water": "Flood/Water Products",
+    "natural": None,
+    "falsecolor": None,
+    "gis": "GIS/Vector Products",
+    "vector": "GIS/Vector Products",
+}
+
+# Generic directory names that are never reported as an "Other/" source
+_GENERIC_DIRS = frozenset(("tif", "tiff", "processed", "output"))
+
+
+@functools.lru_cache(maxsize=None)
+def _classify_by_dir(parent_dir: str) -> Optional[str]:
     """
-    Extract all unique source products from the DRCS data.
+    Classify a file whose name has no source token, using only its parent directory.
+    
+    Mirrors the directory rules of _classify_file, in the same order.
+    """
+    parent_lower = parent_dir.lower()
+    
+    if "aster" in parent_lower:
+        return "ASTER"
+    if "master" in parent_lower:
+        return "MASTER"
+    if "aria" in parent_lower:
+        return "ARIA"
+    if parent_lower == "planet":
+        return "Planet"
+    if parent_lower == "maxar":
+        return "Maxar"
+    if parent_lower == "hls":
+        return "HLS (Harmonized Landsat Sentinel)"
+    if parent_lower == "emit":
+        return "EMIT"
+    if parent_lower == "ecostress":
+        return "ECOSTRESS"
+    if parent_dir in _DIR_SOURCE_MAP:
+        return _DIR_SOURCE_MAP[parent_dir]
+    if parent_dir and parent_dir not in _GENERIC_DIRS:
+        return sys.intern(f"Other/{parent_dir}")
+    return None
+
+
+def _classify_file(file: str, parent_dir: str, parent_lower: Optional[str] = None) -> Optional[str]:
+    """
+    Return the source product a file belongs to, or None if it isn't categorized.
+    
+    parent_lower is parent_dir.lower(); callers classifying a whole directory
+    pass it in so it is computed once.
+    """
+    if parent_lower is None:
+        parent_lower = parent_dir.lower()
+    file_lower = file.lower()
+    
+    # One compiled scan rules out all file-name patterns for most files
+    if _FILE_TOKEN_RE.search(file_lower) is None:
+        return _classify_by_dir(parent_dir)
+    
+    # Identify source products based on patterns (order matters: names often
+    # contain several tokens, so the first matching rule wins)
+    if "sentinel" in file_lower or file_lower.startswith("s1") or file_lower.startswith("s2"):
+        if "s1" in file_lower or "sentinel-1" in file_lower:
+            return "Sentinel-1"
+        return "Sentinel-2"
+    if "landsat" in file_lower or file_lower.startswith("lc08") or file_lower.startswith("le07"):
+        return "Landsat"
+    if "modis" in file_lower:
+        return "MODIS"
+    if "viirs" in file_lower or "vnp" in file_lower or "vj1" in file_lower:
+        return "VIIRS"
+    if "aster" in parent_lower:
+        return "ASTER"
+    if "master" in parent_lower or "master" in file_lower:
+        return "MASTER"
+    if "aria" in parent_lower or "aria" in file_lower:
+        return "ARIA"
+    if "planet" in file_lower or parent_lower == "planet":
+        return "Planet"
+    if "maxar" in file_lower or parent_lower == "maxar":
+        return "Maxar"
+    if "hls" in file_lower or parent_lower == "hls":
+        return "HLS (Harmonized Landsat Sentinel)"
+    if "emit" in file_lower or parent_lower == "emit":
+        return "EMIT"
+    if "ecostress" in file_lower or parent_lower == "ecostress":
+        return "ECOSTRESS"
+    if "icesat" in file_lower:
+        return "ICESat"
+    if "smap" in file_lower:
+        return "SMAP"
+    if "gpm" in file_lower or "imerg" in file_lower:
+        return "GPM/IMERG"
+    if "goes" in file_lower:
+        return "GOES"
+    if "worldview" in file_lower:
+        return "WorldView"
+    if parent_dir in _DIR_SOURCE_MAP:
+        return _DIR_SOURCE_MAP[parent_dir]
+    # Additional pattern matching for files
+    if "gedi" in file_lower:
+        return "GEDI"
+    if parent_dir and parent_dir not in _GENERIC_DIRS:
+        # Capture other directory names as potential sources
+        return sys.intern(f"Other/{parent_dir}")
+    return None
+
+
+def _walk_drcs(data: Dict) -> Iterator[Tuple[Tuple[str, ...], List[str]]]:
+    """
+    Yield (path_tuple, files) for every '_files' list under data["drcs_activations"].
+    
+    Lists are yielded in the same order as a recursive walk of the tree, which is
+    also the order they appear in the JSON document.
+    """
+    if "drcs_activations" not in data:
+        return
+    
+    # Explicit stack of (value, path, is_files); children are pushed in reverse
+    # so entries are visited in the same order as a recursive walk
+    stack = [(data["drcs_activations"], (), False)]
+    
+    while stack:
+        obj, path, is_files = stack.pop()
+        
+        if is_files:
+            yield path, obj
+            continue
+        
+        if not isinstance(obj, dict):
+            continue
+        
+        children = []
+        for key, value in obj.items():
+            if key == "_files":
+                if isinstance(value, list):
+                    children.append((value, path, True))
+            elif key != "_metadata":
+                children.append((value, path + (key,), False))
+        stack.extend(reversed(children))
+
+
+def stream_drcs(path: Union[str, Path],
+                prefix: str = "drcs_activations") -> Iterator[Tuple[Tuple[str, ...], List[str]]]:
+    """
+    Stream-parse a DRCS JSON file, yielding (path_tuple, files) for every '_files' list.
+    
+    Produces the same events, in the same order, as walking the loaded tree, but only
+    one '_files' list is held in memory at a time. Requires ijson.
+    """
+    with open(path, 'rb') as f:
+        keys = []
+        files = None
+        for event, value in ijson.basic_parse(f):
+            if event == 'start_map' or event == 'start_array':
+                # Only collect '_files' lists reached through objects under the prefix,
+                # skipping anything inside '_metadata'
+                if (event == 'start_array' and keys and keys[-1] == "_files"
+                        and keys[0] == prefix and "_metadata" not in keys
+                        and files is None and None not in keys):
+                    files = []
+                    files_depth = len(keys)
+                keys.append(None)
+            elif event == 'map_key':
+                keys[-1] = value
+            elif event == 'end_map' or event == 'end_array':
+                keys.pop()
+                if files is not None and len(keys) == files_depth:
+                    yield tuple(keys[1:-1]), files
+                    files = None
+            elif files is not None and event == 'string' and len(keys) == files_depth + 1:
+                files.append(value)
+
+
+def analyze(data: Dict) -> Tuple[Dict[str, Dict], Dict[str, int]]:
+    """
+    Extract source products and count files per directory name in a single walk.
+    
+    Returns (source_products, dir_counts), matching extract_source_products()
+    and analyze_all_directories() respectively.
+    """
+    return analyze_events(_walk_drcs(data))
+
+
+def analyze_events(events: Iterable[Tuple[Tuple[str, ...], List[str]]]) -> Tuple[Dict[str, Dict], Dict[str, int]]:
     """
+    Aggregate (path_tuple, files) events from _walk_drcs() or stream_drcs().
+    
+    Returns (source_products, dir_counts), as analyze() does.
+    """
+    return _summarize(*_aggregate(events))
+
+
+def analyze_parallel(data: Dict, max_workers: Optional[int] = None) -> Tuple[Dict[str, Dict], Dict[str, int]]:
+    """
+    Like analyze(), but analyzes each top-level event in a separate process.
+    
+    Partial results are merged in event order, so the output is identical to
+    analyze(). Runs serially when there are fewer than PARALLEL_MIN_EVENTS events.
+    """
+    events = list(data.get("drcs_activations", {}).items())
+    if len(events) < PARALLEL_MIN_EVENTS:
+        return analyze(data)
+    
+    workers = max_workers or os.cpu_count() or 1
+    chunksize = max(1, len(events) // (4 * workers))
+    
     source_products = defaultdict(set)
     file_examples = defaultdict(list)
+    dir_counts = defaultdict(int)
     
-    def traverse(obj, path=""):
-        if isinstance(obj, dict):
-            for key, value in obj.items():
-                if key == "_files" and isinstance(value, list):
-                    # Analyze files in this directory
-                    parent_dir = path.split("/")[-1] if path else ""
-                    
-                    for file in value:
-                        file_lower = file.lower()
-                        
-                        # Identify source products based on patterns
-                        if "sentinel" in file_lower or file_lower.startswith("s1") or file_lower.startswith("s2"):
-                            if "s1" in file_lower or "sentinel-1" in file_lower:
-                                source = "Sentinel-1"
-                            else:
-                                source = "Sentinel-2"
-                            source_products[source].add(parent_dir)
-                            if len(file_examples[source]) < 3:
-                                file_examples[source].append(f"{path}/{file}")
-                        
-                        elif "landsat" in file_lower or file_lower.startswith("lc08") or file_lower.startswith("le07"):
-                            source = "Landsat"
-                            source_products[source].add(parent_dir)
-                            if len(file_examples[source]) < 3:
-                                file_examples[source].append(f"{path}/{file}")
-                        
-                        elif "modis" in file_lower:
-                            source = "MODIS"
-                            source_products[source].add(parent_dir)
-                            if len(file_examples[source]) < 3:
-                                file_examples[source].append(f"{path}/{file}")
-                        
-                        elif "viirs" in file_lower or "vnp" in file_lower or "vj1" in file_lower:
-                            source = "VIIRS"
-                            source_products[source].add(parent_dir)
-                            if len(file_examples[source]) < 3:
-                                file_examples[source].append(f"{path}/{file}")
-                        
-                        elif "aster" in parent_dir.lower():
-                            source = "ASTER"
-                            source_products[source].add(parent_dir)
-                            if len(file_examples[source]) < 3:
-                                file_examples[source].append(f"{path}/{file}")
-                        
-                        elif "master" in parent_dir.lower() or "master" in file_lower:
-                            source = "MASTER"
-                            source_products[source].add(parent_dir)
-                            if len(file_examples[source]) < 3:
-                                file_examples[source].append(f"{path}/{file}")
-                        
-                        elif "aria" in parent_dir.lower() or "aria" in file_lower:
-                            source = "ARIA"
-                            source_products[source].add(parent_dir)
-                            if len(file_examples[source]) < 3:
-                                file_examples[source].append(f"{path}/{file}")
-                        
-                        elif "planet" in file_lower or parent_dir.lower() == "planet":
-                            source = "Planet"
-                            source_products[source].add(parent_dir)
-                            if len(file_examples[source]) < 3:
-                                file_examples[source].append(f"{path}/{file}")
-                        
-                        elif "maxar" in file_lower or parent_dir.lower() == "maxar":
-                            source = "Maxar"
-                            source_products[source].add(parent_dir)
-                            if len(file_examples[source]) < 3:
-                                file_examples[source].append(f"{path}/{file}")
-                        
-                        elif "hls" in file_lower or parent_dir.lower() == "hls":
-                            source = "HLS (Harmonized Landsat Sentinel)"
-                            source_products[source].add(parent_dir)
-                            if len(file_examples[source]) < 3:
-                                file_examples[source].append(f"{path}/{file}")
-                        
-                        elif "emit" in file_lower or parent_dir.lower() == "emit":
-                            source = "EMIT"
-                            source_products[source].add(parent_dir)
-                            if len(file_examples[source]) < 3:
-                                file_examples[source].append(f"{path}/{file}")
-                        
-                        elif "ecostress" in file_lower or parent_dir.lower() == "ecostress":
-                            source = "ECOSTRESS"
-                            source_products[source].add(parent_dir)
-                            if len(file_examples[source]) < 3:
-                                file_examples[source].append(f"{path}/{file}")
-                        
-                        elif "icesat" in file_lower:
-                            source = "ICESat"
-                            source_products[source].add(parent_dir)
-                            if len(file_examples[source]) < 3:
-                                file_examples[source].append(f"{path}/{file}")
-                        
-                        elif "smap" in file_lower:
-                            source = "SMAP"
-                            source_products[source].add(parent_dir)
-                            if len(file_examples[source]) < 3:
-                                file_examples[source].append(f"{path}/{file}")
-                        
-                        elif "gpm" in file_lower or "imerg" in file_lower:
-                            source = "GPM/IMERG"
-                            source_products[source].add(parent_dir)
-                            if len(file_examples[source]) < 3:
-                                file_examples[source].append(f"{path}/{file}")
-                        
-                        elif "goes" in file_lower:
-                            source = "GOES"
-                            source_products[source].add(parent_dir)
-                            if len(file_examples[source]) < 3:
-                                file_examples[source].append(f"{path}/{file}")
-                        
-                        elif "worldview" in file_lower:
-                            source = "WorldView"
-                            source_products[source].add(parent_dir)
-                            if len(file_examples[source]) < 3:
-                                file_examples[source].append(f"{path}/{file}")
-                        
-                        elif parent_dir in ["dnbr", "dnbr_v2", "nbr"]:
-                            source = "Burn Index Products (dNBR/NBR)"
-                            source_products[source].add(parent_dir)
-                            if len(file_examples[source]) < 3:
-                                file_examples[source].append(f"{path}/{file}")
-                        
-                        elif parent_dir in ["dem", "elevation"]:
-                            source = "DEM (Digital Elevation Model)"
-                            source_products[source].add(parent_dir)
-                            if len(file_examples[source]) < 3:
-                                file_examples[source].append(f"{path}/{file}")
-                        
-                        elif parent_dir in ["flood_extent", "flood", "water"]:
-                            source = "Flood/Water Products"
-                            source_products[source].add(parent_dir)
-                            if len(file_examples[source]) < 3:
-                                file_examples[source].append(f"{path}/{file}")
-                        
-                        elif parent_dir == "natural" or parent_dir == "falsecolor":
-                            # These are usually processed products, skip standalone categorization
-                            pass
-                        
-                        elif parent_dir == "gis" or parent_dir == "vector":
-                            source = "GIS/Vector Products"
-                            source_products[source].add(parent_dir)
-                            if len(file_examples[source]) < 3:
-                                file_examples[source].append(f"{path}/{file}")
-                        
-                        # Additional pattern matching for files
-                        elif "gedi" in file_lower:
-                            source = "GEDI"
-                            source_products[source].add(parent_dir)
-                            if len(file_examples[source]) < 3:
-                                file_examples[source].append(f"{path}/{file}")
-                        
-                        elif parent_dir and parent_dir not in ["tif", "tiff", "processed", "output"]:
-                            # Capture other directory names as potential sources
-                            source = f"Other/{parent_dir}"
-                            source_products[source].add(parent_dir)
-                            if len(file_examples[source]) < 3:
-                                file_examples[source].append(f"{path}/{file}")
-                
-                elif key != "_files" and key != "_metadata":
-                    new_path = f"{path}/{key}" if path else key
-                    traverse(value, new_path)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for part_products, part_examples, part_counts in executor.map(_analyze_event, events, chunksize=chunksize):
+            for source, dirs in part_products.items():
+                source_products[source] |= dirs
+            for source, files in part_examples.items():
+                examples = file_examples[source]
+                examples.extend(files[:max(0, 3 - len(examples))])
+            for dir_name, count in part_counts.items():
+                dir_counts[dir_name] += count
     
-    # Start traversal
-    if "drcs_activations" in data:
-        traverse(data["drcs_activations"])
+    return _summarize(source_products, file_examples, dir_counts)
+
+
+def _analyze_event(event: Tuple[str, Dict]) -> Tuple[Dict[str, Set[str]], Dict[str, List[str]], Dict[str, int]]:
+    """Aggregate a single (event_name, subtree) pair from data["drcs_activations"]."""
+    name, subtree = event
+    return _aggregate(_walk_drcs({"drcs_activations": {name: subtree}}))
+
+
+def _aggregate(events: Iterable[Tuple[Tuple[str, ...], List[str]]]) -> Tuple[Dict[str, Set[str]], Dict[str, List[str]], Dict[str, int]]:
+    """
+    Classify every file in events.
+    
+    Returns (directories per source, up to 3 example paths per source,
+    file count per directory name), all in first-seen order.
+    """
+    source_products = defaultdict(set)
+    file_examples = defaultdict(list)
+    dir_counts = defaultdict(int)
     
+    for path_parts, obj in events:
+        path = "/".join(path_parts)
+        # The same few directory names recur across every event; share one object each
+        parent_dir = sys.intern(path_parts[-1]) if path_parts else ""
+        if parent_dir:
+            dir_counts[parent_dir] += len(obj)
+        
+        # When no name in the directory has a source token, the directory alone
+        # decides the source of every file: classify it once, in bulk
+        if _FILE_TOKEN_RE.search("\n".join(obj).lower()) is None:
+            source = _classify_by_dir(parent_dir)
+            if source is not None and obj:
+                source_products[source].add(parent_dir)
+                examples = file_examples[source]
+                for file in obj[:max(0, 3 - len(examples))]:
+                    examples.append(f"{path}/{file}")
+            continue
+        
+        parent_lower = parent_dir.lower()
+        for file in obj:
+            source = _classify_file(file, parent_dir, parent_lower)
+            if source is None:
+                continue
+            source_products[source].add(parent_dir)
+            # Only build the example path while the list still has room
+            examples = file_examples[source]
+            if len(examples) < 3:
+                examples.append(f"{path}/{file}")
+    
+    return source_products, file_examples, dir_counts
+
+
+def _summarize(source_products: Dict[str, Set[str]],
+               file_examples: Dict[str, List[str]],
+               dir_counts: Dict[str, int]) -> Tuple[Dict[str, Dict], Dict[str, int]]:
+    """Turn _aggregate() output into the (source_products, dir_counts) report shape."""
     # Convert sets to lists and combine with examples
     result = {}
     for source, dirs in source_products.items():
         result[source] = {
-            "directories": sorted(list(dirs)),
+            "directories": sorted(dirs),
             "example_files": file_examples[source][:3],
             "count": len(dirs)
         }
     
-    return result
+    return result, _rank_counts(dir_counts)
 
-def analyze_all_directories(data: Dict) -> Dict[str, int]:
-    """
-    Count files in each unique directory name across all events.
+
+def _rank_counts(dir_counts: Dict[str, int], top_k: Optional[int] = None) -> Dict[str, int]:
     """
-    dir_counts = defaultdict(int)
-    
-    def traverse(obj, path=""):
-        if isinstance(obj, dict):
-            for key, value in obj.items():
-                if key == "_files" and isinstance(value, list):
-                    parent_dir = path.split("/")[-1] if path else ""
-                    if parent_dir:
-                        dir_counts[parent_dir] += len(value)
-                elif key != "_files" and key != "_metadata":
-                    new_path = f"{path}/{key}" if path else key
-                    traverse(value, new_path)
+    Order directory counts from most to least files, keeping first-seen order on ties.
     
-    if "drcs_activations" in data:
-        traverse(data["drcs_activations"])
+    With top_k, only the top_k largest are kept and the full sort is skipped.
+    """
+    if top_k is None:
+        return dict(sorted(dir_counts.items(), key=operator.itemgetter(1), reverse=True))
+    return dict(heapq.nlargest(top_k, dir_counts.items(), key=operator.itemgetter(1)))
+
+def extract_source_products(data: Dict) -> Dict[str, List[str]]:
+    """
+    Extract all unique source products from the DRCS data.
+    """
+    return analyze(data)[0]
+
+def analyze_all_directories(data: Dict, top_k: Optional[int] = None) -> Dict[str, int]:
+    """
+    Count files in each unique directory name across all events.
     
-    return dict(sorted(dir_counts.items(), key=lambda x: x[1], reverse=True))
+    With top_k, only the top_k directory names by file count are returned.
+    """
+    return _rank_counts(_aggregate(_walk_drcs(data))[2], top_k)
 
 def main():
-    # Load the JSON file
-    with open('drcs_activations_tif_files.json', 'r') as f:
-        data = json.load(f)
-    
-    # Extract source products
-    source_products = extract_source_products(data)
+    json_path = Path('drcs_activations_tif_files.json')
     
-    # Analyze all directories
-    dir_counts = analyze_all_directories(data)
+    # Extract source products and directory counts in one pass, streaming very large
+    # files and spreading large loaded ones over a process pool
+    size = json_path.stat().st_size
+    if ijson is not None and size > STREAM_THRESHOLD_BYTES:
+        source_products, dir_counts = analyze_events(stream_drcs(json_path))
+    else:
+        raw = json_path.read_bytes()
+        data = orjson.loads(raw) if orjson is not None else json.loads(raw)
+        if size > PARALLEL_THRESHOLD_BYTES:
+            source_products, dir_counts = analyze_parallel(data)
+        else:
+            source_products, dir_counts = analyze(data)
     
     # Print results
     print("=" * 80)
@@ -254,8 +409,11 @@ def main():
         "directory_statistics": dir_counts
     }
     
-    with open('source_products_analysis.json', 'w') as f:
-        json.dump(output, f, indent=2)
+    if orjson is not None:
+        encoded = orjson.dumps(output, option=orjson.OPT_INDENT_2)
+    else:
+        encoded = json.dumps(output, indent=2).encode("utf-8")
+    Path('source_products_analysis.json').write_bytes(encoded)
     
     print("\n" + "=" * 80)
     print("Analysis saved to source_products_analysis.json")